@@ -1,5 +1,4 @@
 from blackduck import Client
-from datetime import datetime
 import sys
 import os
 import requests
@@ -7,6 +6,20 @@ import argparse
 import time
 import logging
 import zipfile
+import io
+import shutil
+import pathlib
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Prefer orjson for decoding large SBOM payloads when it is installed
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    import json
+    json_loads = json.loads
 
 # Configuration:
 BLACK_DUCK_URL = "https://solidigm.app.blackduck.com"
@@ -16,6 +29,20 @@ BLACK_DUCK_URL = "https://solidigm.app.blackduck.com"
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+class BlackDuckRetry(Retry):
+    """Retry transient failures, but retry POSTs only when the server did not process them."""
+
+    # POSTs such as report creation are not idempotent. A 500/502/504 or a read
+    # timeout may come after the server has queued the work, so only 429 and
+    # 503, which mean the request was rejected, are retried for POST.
+    POST_RETRY_STATUS = frozenset([429, 503])
+
+    def is_retry(self, method, status_code, has_retry_after=False):
+        if method and method.upper() == 'POST':
+            return bool(self.total) and status_code in self.POST_RETRY_STATUS
+        return super().is_retry(method, status_code, has_retry_after)
+
+
 def connect_blackduck(api_token):
     """Establish connection to Black Duck."""
     try:
@@ -25,6 +52,19 @@ def connect_blackduck(api_token):
             timeout=60.0,
             verify=True
         )
+        # Pool connections to the single Black Duck host so keep-alive
+        # connections are reused across API calls, and retry transient
+        # failures so a single 5xx does not restart report generation.
+        # POST is left out of allowed_methods so read errors never resend it.
+        # BlackDuckRetry still retries a POST that was rejected with 429/503.
+        retry = BlackDuckRetry(
+            total=6,
+            backoff_factor=0.5,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,
+        )
+        bd.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=16, max_retries=retry))
         logger.info("Connected to Black Duck successfully!")
         return bd
     except Exception as e:
@@ -32,6 +72,11 @@ def connect_blackduck(api_token):
         sys.exit(1)
 
 
+def get_id_from_url(url):
+    """Return the trailing id segment of a Black Duck resource url."""
+    return url.rpartition('/')[2]
+
+
 #Create Project
 def create_project(bd, project_name, description=None):
     """Create a new project in Black Duck."""
@@ -52,43 +97,93 @@ def create_project(bd, project_name, description=None):
 
 def get_project(bd, project_name):
 
-    projects = bd.get_resource("projects", params={"q": f"name:{project_name}"})
-    
-    for project in projects:
-        if project.get("name") == project_name:           
-            logger.info(f"Found project: {project.get('name')}")
-            project_id = project.get("_meta")['href'].split('/')[-1]
-            return project, project_id
-    logger.error(f"Project '{project_name}' not found.")
-    sys.exit(1)
+    # Query the projects endpoint directly to skip the /api/ root resource lookup
+    projects = bd.get_items("/api/projects", params={"q": f"name:{project_name}"})
+    project = next((p for p in projects if p.get("name") == project_name), None)
+
+    if not project:
+        logger.error(f"Project '{project_name}' not found.")
+        sys.exit(1)
+
+    logger.info(f"Found project: {project.get('name')}")
+    project_id = get_id_from_url(project.get("_meta")['href'])
+    return project, project_id
 
 
 
 #Get Version ID
 def get_version(bd, project, version_name=None):
     """Retrieve a project version by name or default to the latest version."""
-    versions = list(bd.get_resource("versions", parent=project))
-    if versions:
-        if version_name:
-            version = next((v for v in versions if v['versionName'] == version_name), None)
-        else:
-            version = versions[0]
-
-        if version:
-           # logger.info(f"Found version: {version}")
-
-            version_id = version["_meta"]["href"].split("/")[-1]  
-            logger.info(f"Version ID: {version_id}")
-            return {"id": version_id, "versionName": version['versionName']}  
-        else:
-            logger.error(f"Version '{version_name}' not found.")
+    if version_name:
+        # The server filters by name; stop at the first exact match
+        versions = bd.get_resource("versions", parent=project,
+                                   params={"q": f"versionName:{version_name}"})
+        version = next((v for v in versions if v['versionName'] == version_name), None)
+    else:
+        # Only the newest version is needed, let the server sort and limit
+        versions = bd.get_resource("versions", parent=project, page_size=1,
+                                   params={"sort": "createdAt DESC"})
+        version = next(iter(versions), None)
+        if not version:
+            logger.error("No versions found for the project.")
             sys.exit(1)
+
+    if version:
+        version_id = get_id_from_url(version["_meta"]["href"])  
+        logger.info(f"Version ID: {version_id}")
+        return {"id": version_id, "versionName": version['versionName']}  
     else:
-        logger.error("No versions found for the project.")
+        logger.error(f"Version '{version_name}' not found.")
         sys.exit(1)
 
+def get_retry_after(response):
+    """Return the Retry-After header in seconds, or None if absent or not numeric."""
+    value = response.headers.get('Retry-After')
+    try:
+        return max(float(value), 0) if value is not None else None
+    except ValueError:
+        return None
+
+
+#Wait until the report is generated
+def wait_for_report(bd, project_id, version_id, report_id, max_wait=600, initial_delay=None):
+    """Poll the report status until it is COMPLETED and return the report JSON.
+
+    Backs off exponentially, waiting longer when the server's Retry-After
+    header asks for it.
+    """
+    url = f"/api/projects/{project_id}/versions/{version_id}/reports/{report_id}"
+
+    headers = {
+        'Accept': 'application/vnd.blackducksoftware.report-4+json',
+    }
+    delay = 1
+    deadline = time.monotonic() + max_wait
+    if initial_delay:
+        time.sleep(min(initial_delay, max_wait))
+    while True:
+        response = bd.session.get(url, headers=headers)
+        response.raise_for_status()
+
+        report = json_loads(response.content)
+        status = report.get('status')
+        logger.debug(f"Report {report_id} status: {status}")
+        if status == 'COMPLETED':
+            return report
+        if status == 'FAILED':
+            raise RuntimeError(f"SBOM report {report_id} generation failed.")
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise TimeoutError(f"SBOM report {report_id} not completed after {max_wait} seconds.")
+
+        # Never poll faster than the backoff, even on a Retry-After of 0
+        retry_after = get_retry_after(response)
+        sleep_for = max(delay, retry_after or 0)
+        time.sleep(min(sleep_for, remaining))
+        delay = min(delay * 2, 15)
+
 #create Report from version and project name
-def create_sbom_report(bd, project_id, version_id):
+def create_sbom_report(bd, project_id, version_id, max_wait=600):
     """Create an SBOM report for the given project version."""
     url = f"/api/projects/{project_id}/versions/{version_id}/sbom-reports"
     
@@ -101,21 +196,25 @@ def create_sbom_report(bd, project_id, version_id):
     }
     try:
         response = bd.session.post(url, headers=headers, json=payload)
-        rep_status = response.raise_for_status()
+        response.raise_for_status()
 
-        if response.status_code == 201:
+        if response.status_code in (201, 202):
             try:        
                 # Retrieve and log the Location header
                 location = response.headers.get('Location')
-                report_id = location.split("/")[-1]
+                report_id = get_id_from_url(location)
                 logger.info(f"Report_id : {report_id}")
 
                 logger.info("Please Wait SBOM report generating....")
-                #waiting for creating report. If need increase more seconds
-                time.sleep(30)
-                
-                return report_id
-            except requests.exceptions.JSONDecodeError:
+                #waiting for creating report, the completed report carries its filename.
+                #Increase max_wait for larger reports
+                report = wait_for_report(bd, project_id, version_id, report_id, max_wait,
+                                         get_retry_after(response))
+                filename = report.get('fileName')
+
+                return report_id, filename
+            except ValueError:
+                # Raised by both orjson and json when the report status is not JSON
                 logger.error("Failed to decode the response as JSON")
                 return None
 
@@ -145,7 +244,7 @@ def get_sbom_report_name(bd, project_id: str, version_id: str, reportId: str):
     response = bd.session.get(url, headers=headers)
     response.raise_for_status()
 
-    report_list = response.json()
+    report_list = json_loads(response.content)
     logger.debug(f"Response content: {report_list}")
     
     reports = report_list.get("fileName")
@@ -156,24 +255,72 @@ def get_sbom_report_name(bd, project_id: str, version_id: str, reportId: str):
 
 
 
-def download_sbom_report(bd, project_id: str, version_id: str, report_id: str):
-    # Download the latest report
+# Reports smaller than this are extracted from memory instead of a temp zip
+IN_MEMORY_REPORT_LIMIT = 64 * 1024 * 1024
+
+def download_sbom_report(bd, project_id: str, version_id: str, report_id: str, filename=None):
+    # Download the latest report. Returns the zip filename, or an in-memory
+    # BytesIO buffer for reports below IN_MEMORY_REPORT_LIMIT
     download_url = f"/api/projects/{project_id}/versions/{version_id}/reports/{report_id}/download"
     print("Starting download...")
 
     try:
-        response = bd.session.get(download_url)
-        response.raise_for_status()
-
-        filename = get_sbom_report_name(bd, project_id, version_id, report_id)
-        logger.info(f"SBOM report created successfully. Report filename: {filename}")
+        if filename:
+            response = bd.session.get(download_url, stream=True)
+        else:
+            # Fetch the report filename and start the download in parallel
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                f_name = executor.submit(get_sbom_report_name, bd, project_id, version_id, report_id)
+                f_dl = executor.submit(bd.session.get, download_url, stream=True)
+            response = f_dl.result()
+
+        with response:
+            response.raise_for_status()
+
+            if not filename:
+                filename = f_name.result()
+            logger.info(f"SBOM report created successfully. Report filename: {filename}")
+
+            # Content-Length is only the on-disk size when the body is not compressed
+            content_length = 0
+            if not response.headers.get('Content-Encoding'):
+                content_length = int(response.headers.get('Content-Length', '0'))
+
+            if 0 < content_length < IN_MEMORY_REPORT_LIMIT:
+                buffer = io.BytesIO()
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    if chunk:
+                        buffer.write(chunk)
+                if buffer.tell():
+                    buffer.seek(0)
+                    print(f"Report '{filename}' downloaded successfully into memory.")
+                    return buffer
+                print("Download failed: No content in the response.")
+                return None
 
-        if response.content:
-            with open(filename, 'wb') as file:
-                file.write(response.content)
+            written = 0
+            try:
+                with open(filename, 'wb') as file:
+                    if content_length and hasattr(os, 'posix_fallocate'):
+                        os.posix_fallocate(file.fileno(), 0, content_length)
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        if chunk:
+                            file.write(chunk)
+                            written += len(chunk)
+                    # Drop any pre-allocated tail if fewer bytes arrived
+                    file.truncate(written)
+            except Exception:
+                # A cut-off download is unusable, do not leave a partial or
+                # zero-filled zip behind
+                if os.path.exists(filename):
+                    os.remove(filename)
+                raise
+
+        if written:
             print(f"Report downloaded successfully as '{filename}'.")
             return filename
         else:
+            os.remove(filename)
             print("Download failed: No content in the response.")
 
     except requests.exceptions.HTTPError as http_err:
@@ -182,26 +329,58 @@ def download_sbom_report(bd, project_id: str, version_id: str, report_id: str):
         print(f"An error occurred: {err}")
     
 
+def copy_zip_entry(zip_ref, info, dest):
+    """Stream an open ZIP entry to dest, pre-allocating its size on Linux."""
+    with zip_ref.open(info) as src, open(dest, 'wb') as dst:
+        if info.file_size and hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(dst.fileno(), 0, info.file_size)
+        shutil.copyfileobj(src, dst, length=1024 * 1024)
+
+
+def extract_zip_entries(zip_file, infos, root):
+    """Extract ZIP entries in order to the flattened destination folder.
+
+    zip_file is either an open ZipFile or a path to the archive.
+    """
+    if not isinstance(zip_file, zipfile.ZipFile):
+        # ZipFile is not safe for concurrent reads, open a handle per task
+        with zipfile.ZipFile(zip_file, 'r') as zip_ref:
+            return extract_zip_entries(zip_ref, infos, root)
+
+    for info in infos:
+        dest = root / os.path.basename(info.filename)
+        copy_zip_entry(zip_file, info, dest)
+        print(f"Extracted and moved {info.filename} to {dest}")
+
+
 #extract the report and save the .Json file on current working folder
 def extract_and_flatten(zip_file_path, extract_to_folder=None):
     try:
         if extract_to_folder is None:
             extract_to_folder = os.getcwd()
 
-        if not os.path.exists(extract_to_folder):
-            os.makedirs(extract_to_folder)
+        root = pathlib.Path(extract_to_folder)
+        root.mkdir(parents=True, exist_ok=True)
 
         with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
-            for file in zip_ref.namelist():
-                file_name = os.path.basename(file)
+            entries = [info for info in zip_ref.infolist() if os.path.basename(info.filename)]
 
-                if file_name:
-                    zip_ref.extract(file, extract_to_folder)
+            # SBOM archives usually hold a single JSON file, extract it from
+            # the already open handle without spinning up a thread pool.
+            # In-memory buffers cannot be shared between threads either.
+            if len(entries) == 1 or not isinstance(zip_file_path, (str, os.PathLike)):
+                extract_zip_entries(zip_ref, entries, root)
+                return
 
-                    extracted_file_path = os.path.join(extract_to_folder, file_name)
+        # Flattening maps entries with the same basename to the same file, so
+        # those are extracted serially in archive order (the last one wins)
+        groups = {}
+        for info in entries:
+            groups.setdefault(os.path.basename(info.filename), []).append(info)
 
-                    os.rename(os.path.join(extract_to_folder, file), extracted_file_path)
-                    print(f"Extracted and moved {file} to {extracted_file_path}")
+        # Groups are independent, decompress them in parallel
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            list(executor.map(lambda infos: extract_zip_entries(zip_file_path, infos, root), groups.values()))
 
     except zipfile.BadZipFile:
         print(f"Error: The file {zip_file_path} is not a valid ZIP archive.")
@@ -235,10 +414,16 @@ def main():
 
         # Create the SBOM report
         if args.create_report:
-            report_id = create_sbom_report(bd, project_id, version['id'])
-            sbom_report_file = download_sbom_report(bd, project_id, version['id'], report_id)
+            report = create_sbom_report(bd, project_id, version['id'])
+            if not report:
+                sys.exit(1)
+            report_id, filename = report
+            sbom_report_file = download_sbom_report(bd, project_id, version['id'], report_id, filename)
+            if not sbom_report_file:
+                sys.exit(1)
             extract_and_flatten(sbom_report_file)
-            os.remove(sbom_report_file)
+            if isinstance(sbom_report_file, str):
+                os.remove(sbom_report_file)
 
 
 